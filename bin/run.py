@@ -9,6 +9,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 
 from piplant.app import create_app
 import piplant.scheduler
+import piplant.retention
 
 
 if __name__ == "__main__":
@@ -31,6 +32,7 @@ if __name__ == "__main__":
     if not args.disable_scheduler:
         scheduler = BackgroundScheduler(daemon=True)
         scheduler.add_job(piplant.scheduler.Scheduler(app=app).update, "interval", seconds=10)
+        scheduler.add_job(piplant.retention.Retention(app=app).enforce, "interval", hours=1)
         scheduler.start()
 
         if args.debug:
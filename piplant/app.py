@@ -3,6 +3,7 @@ import os
 
 from flask import Flask
 from . import __version__
+from .retention import DEFAULT_POLICIES
 
 
 def create_app(test_config=None):
@@ -12,6 +13,8 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY='dev',
         DATABASE=os.path.join(app.instance_path, 'db.sqlite'),
+        RETENTION_POLICIES=DEFAULT_POLICIES,
+        RETENTION_BATCH_SIZE=1000,
     )
     app.jinja_env.globals['BUILD_VERSION'] = __version__
 
@@ -31,7 +34,9 @@ def create_app(test_config=None):
 
         # Init the database
         from piplant.models import db
+        from piplant import migrations
         db.init_app(app)
+        migrations.upgrade(db.engine)
         db.create_all()
 
         # Init the auth manager
@@ -0,0 +1,38 @@
+"""Shape preserving downsampling of time series for charts."""
+import numpy as np
+
+
+def lttb(x, y, threshold: int):
+    """Downsample a series to ``threshold`` points with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. Every other point is picked from
+    its bucket as the one forming the largest triangle with the previously picked
+    point and the mean of the next bucket, which keeps peaks and troughs visible.
+    Returns the selected ``(x, y)`` as numpy arrays.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return x, y
+
+    # threshold - 2 buckets covering every point except the first and the last
+    edges = np.linspace(1, size - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = size - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x = x[high:edges[bucket + 2]].mean()
+            next_y = y[high:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        areas = np.abs((x[previous] - next_x) * (y[low:high] - y[previous]) - (x[previous] - x[low:high]) * (next_y - y[previous]))
+        previous = low + int(areas.argmax())
+        selected[bucket + 1] = previous
+
+    return x[selected], y[selected]
@@ -6,7 +6,7 @@ from urllib.parse import urlparse
 from werkzeug.security import generate_password_hash
 from flask_login import current_user
 
-from . import messages
+from . import messages, rollups
 from .models import db, User, Device, TPLinkSmartPlug, Schedule, DataPoint, DS18B20
 
 
@@ -179,13 +179,34 @@ def get_tasks(user_id):
     return tasks
 
 
-def create_data_point(device_id: int, key: str, value: str, timestamp: str) -> DataPoint:
+def create_data_point(device_id: int, key: str, value: float, timestamp) -> DataPoint:
     datapoint = DataPoint(device_id=device_id, key=key, value=value, timestamp=timestamp)
     db.session.add(datapoint)
+    rollups.add([{'device_id': int(device_id), 'key': key, 'value': datapoint.value, 'timestamp': datapoint.timestamp}])
     db.session.commit()
     return datapoint
 
 
+def create_data_points(data_points: List[dict]) -> int:
+    """Insert many data points in a single transaction.
+
+    Each item is a dict with ``device_id``, ``key``, ``value`` and ``timestamp``.
+    The rows and their rollups are written with one executemany each and one
+    commit, instead of a commit per data point as ``create_data_point`` does.
+    """
+    rows = [{
+        'device_id': int(data_point['device_id']),
+        'key': data_point['key'],
+        'value': float(data_point['value']),
+        'timestamp': DataPoint.to_epoch(data_point['timestamp'])
+    } for data_point in data_points]
+    if rows:
+        db.session.execute(DataPoint.__table__.insert(), rows)
+        rollups.add(rows)
+    db.session.commit()
+    return len(rows)
+
+
 def get_data_point(data_point_id: int) -> DataPoint:
     return DataPoint.query.filter_by(id=data_point_id).first()
 
@@ -194,6 +215,22 @@ def get_all_data_points_by_device_id(device_id: int) -> List[DataPoint]:
     return [data_point for data_point in db.session.query(DataPoint).filter(DataPoint.device_id == device_id).all()]
 
 
+def iter_data_points(device_id: int, keys: List[str] = None, start: float = None, end: float = None, batch_size: int = 1000):
+    """Yield (id, key, value, timestamp) rows of a device ordered by key and time.
+
+    Rows are fetched from the cursor ``batch_size`` at a time, so memory use
+    does not depend on how much history the device has.
+    """
+    query = db.session.query(DataPoint.id, DataPoint.key, DataPoint.value, DataPoint.timestamp).filter(DataPoint.device_id == device_id)
+    if keys:
+        query = query.filter(DataPoint.key.in_(keys))
+    if start is not None:
+        query = query.filter(DataPoint.timestamp >= start)
+    if end is not None:
+        query = query.filter(DataPoint.timestamp < end)
+    return query.order_by(DataPoint.key, DataPoint.timestamp).yield_per(batch_size)
+
+
 # TODO: Should a data point be allowed to be updated?
 
 
@@ -8,3 +8,8 @@ CREATE_USER_ERROR = "Could not create user."
 EMAIL_CANNOT_BE_EMPTY = "Email address cannot be empty."
 PASSWORD_CANNOT_BE_EMPTY = "Password cannot be empty"
 USER_NOT_FOUND = "User not found."
+DEVICE_NOT_FOUND = "Device not found."
+VALUE_NOT_NUMERIC = "Data point values must be numeric."
+INVALID_TIMESTAMP = "Timestamps must be epoch seconds or ISO 8601."
+INVALID_MAX_POINTS = "max_points must be between 3 and 10000."
+INVALID_EXPORT_FORMAT = "Export format must be ndjson or csv."
@@ -0,0 +1,136 @@
+import datetime
+import logging
+
+from sqlalchemy import inspect
+
+
+def _to_real(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_epoch(timestamp):
+    try:
+        return datetime.datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _has_table(connection, name):
+    return connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def typed_data_points(connection):
+    """Rebuild data_point with a numeric value, an epoch timestamp and a (device_id, key, timestamp) index.
+
+    Rows whose value is not numeric or whose timestamp cannot be parsed are dropped.
+    """
+    if not _has_table(connection, 'data_point'):
+        return
+
+    connection.create_function('to_real', 1, _to_real)
+    connection.create_function('to_epoch', 1, _to_epoch)
+
+    connection.execute("ALTER TABLE data_point RENAME TO data_point_old")
+    connection.execute(
+        "CREATE TABLE data_point ("
+        " id INTEGER NOT NULL,"
+        " device_id INTEGER NOT NULL,"
+        " key TEXT NOT NULL,"
+        " value FLOAT NOT NULL,"
+        " timestamp FLOAT NOT NULL,"
+        " PRIMARY KEY (id))"
+    )
+    connection.execute(
+        "INSERT INTO data_point (id, device_id, key, value, timestamp)"
+        " SELECT id, device_id, key, to_real(value), to_epoch(timestamp) FROM data_point_old"
+        " WHERE to_real(value) IS NOT NULL AND to_epoch(timestamp) IS NOT NULL"
+    )
+    dropped = connection.execute("SELECT (SELECT count(*) FROM data_point_old) - (SELECT count(*) FROM data_point)").fetchone()[0]
+    if dropped:
+        logging.warning("Dropped %s data point(s) that could not be converted" % dropped)
+    connection.execute("DROP TABLE data_point_old")
+    connection.execute("CREATE INDEX ix_data_point_device_id_key_timestamp ON data_point (device_id, key, timestamp)")
+
+
+def rollups(connection):
+    """Create the rollup table and backfill it from the existing data points."""
+    connection.execute(
+        "CREATE TABLE rollup ("
+        " device_id INTEGER NOT NULL,"
+        " key TEXT NOT NULL,"
+        " resolution INTEGER NOT NULL,"
+        " bucket INTEGER NOT NULL,"
+        " count INTEGER NOT NULL,"
+        " min FLOAT NOT NULL,"
+        " max FLOAT NOT NULL,"
+        " sum FLOAT NOT NULL,"
+        " last FLOAT NOT NULL,"
+        " last_timestamp FLOAT NOT NULL,"
+        " PRIMARY KEY (device_id, key, resolution, bucket))"
+    )
+    if not _has_table(connection, 'data_point'):
+        return
+
+    for resolution in (60, 3600, 86400):
+        connection.execute(
+            "INSERT INTO rollup (device_id, key, resolution, bucket, count, min, max, sum, last, last_timestamp)"
+            " SELECT device_id, key, :resolution, CAST(timestamp / :resolution AS INTEGER) * :resolution AS bucket,"
+            " count(*), min(value), max(value), sum(value), 0, max(timestamp)"
+            " FROM data_point GROUP BY device_id, key, bucket",
+            {'resolution': resolution}
+        )
+    connection.execute(
+        "UPDATE rollup SET last = ("
+        " SELECT value FROM data_point"
+        " WHERE data_point.device_id = rollup.device_id AND data_point.key = rollup.key AND data_point.timestamp = rollup.last_timestamp"
+        " ORDER BY data_point.id DESC LIMIT 1)"
+    )
+
+
+# Each migration upgrades the schema by one version. The current version is
+# stored in SQLite's user_version pragma. Never reorder or remove entries.
+MIGRATIONS = [
+    typed_data_points,
+    rollups,
+]
+
+
+def upgrade(engine):
+    """Bring an existing database up to the current schema.
+
+    Must run before ``db.create_all()``. A database without any tables is
+    considered current, since ``create_all`` builds the latest schema.
+    """
+    fresh = not inspect(engine).get_table_names()
+
+    fairy = engine.raw_connection()
+    connection = fairy.connection
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None  # Manage the transaction manually so DDL is part of it
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        pending = [] if fresh else MIGRATIONS[version:]
+
+        connection.execute("BEGIN")
+        try:
+            for migration in pending:
+                logging.info("Running database migration %s" % migration.__name__)
+                migration(connection)
+            connection.execute("PRAGMA user_version = %d" % len(MIGRATIONS))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        # Let retention hand freed pages back with incremental vacuuming. The
+        # mode only takes effect after a VACUUM, which is instant on a new database.
+        if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            logging.info("Vacuuming database to enable incremental vacuuming")
+            connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            connection.execute("VACUUM")
+    finally:
+        connection.isolation_level = isolation_level
+        fairy.close()
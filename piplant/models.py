@@ -4,7 +4,7 @@ import jwt
 from flask import current_app
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, Text, Boolean
+from sqlalchemy import Column, Integer, Text, Boolean, Float, Index
 
 from . import messages
 
@@ -139,17 +139,55 @@ class DataPoint(db.Model):
     id = Column(Integer, primary_key=True)
     device_id = Column(Integer, nullable=False)
     key = Column(Text, nullable=False)
-    value = Column(Text, nullable=False)
-    timestamp = Column(Text)
+    value = Column(Float, nullable=False)
+    timestamp = Column(Float, nullable=False)  # Seconds since the epoch
+
+    __table_args__ = (
+        Index('ix_data_point_device_id_key_timestamp', 'device_id', 'key', 'timestamp'),
+    )
 
     def __init__(self, device_id, key, value, timestamp):
         self.device_id = device_id
         self.key = key
-        self.value = value
-        self.timestamp = timestamp
+        self.value = float(value)
+        self.timestamp = self.to_epoch(timestamp)
+
+    def get_info(self):
+        return {"id": self.id, "device_id": self.device_id, "key": self.key, "value": self.value, 'timestamp': self.to_isoformat(self.timestamp)}
+
+    @staticmethod
+    def to_epoch(timestamp):
+        """Convert a datetime, an ISO 8601 string or a number to seconds since the epoch.
+
+        Naive datetimes are interpreted as local time, which is how readings have always been stamped.
+        """
+        if isinstance(timestamp, (int, float)):
+            return float(timestamp)
+        if isinstance(timestamp, str):
+            timestamp = datetime.datetime.fromisoformat(timestamp)
+        return timestamp.timestamp()
+
+    @staticmethod
+    def to_isoformat(epoch):
+        return datetime.datetime.fromtimestamp(epoch).isoformat()
+
+
+class Rollup(db.Model):
+    """Aggregate of the data points of one device key over a fixed width time bucket."""
+    device_id = Column(Integer, primary_key=True)
+    key = Column(Text, primary_key=True)
+    resolution = Column(Integer, primary_key=True)  # Bucket width in seconds
+    bucket = Column(Integer, primary_key=True)  # Bucket start in seconds since the epoch
+    count = Column(Integer, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    sum = Column(Float, nullable=False)
+    last = Column(Float, nullable=False)
+    last_timestamp = Column(Float, nullable=False)
 
     def get_info(self):
-        return {"id": self.id, "device_id": self.device_id, "key": self.key, "value": self.value, 'timestamp': self.timestamp}
+        return {"device_id": self.device_id, "key": self.key, "resolution": self.resolution, "bucket": self.bucket, "count": self.count,
+                "min": self.min, "max": self.max, "sum": self.sum, "last": self.last, "last_timestamp": self.last_timestamp}
 
 
 class Schedule(db.Model):
@@ -0,0 +1,90 @@
+import time
+
+from sqlalchemy import text
+
+import piplant.rollups as rollups
+from piplant.models import db, Device
+
+# Days to keep each kind of data for, None keeps it forever. Policies are
+# looked up by device type, falling back to the "default" policy.
+DEFAULT_POLICIES = {
+    'default': {'raw': 7, 'minute': 30, 'hour': 365, 'day': None},
+}
+
+INCREMENTAL_VACUUM = 2
+
+RESOLUTIONS = {'minute': rollups.MINUTE, 'hour': rollups.HOUR, 'day': rollups.DAY}
+
+_DELETE_DATA_POINTS = text(
+    "DELETE FROM data_point WHERE id IN ("
+    " SELECT id FROM data_point WHERE device_id = :device_id AND key = :key AND timestamp < :before LIMIT :limit)"
+)
+
+_DELETE_ROLLUPS = text(
+    "DELETE FROM rollup WHERE rowid IN ("
+    " SELECT rowid FROM rollup WHERE device_id = :device_id AND key = :key AND resolution = :resolution AND bucket < :before LIMIT :limit)"
+)
+
+
+class Retention:
+    """Deletes data that is older than its retention policy allows.
+
+    Rows are deleted in batches of ``RETENTION_BATCH_SIZE``, each in its own
+    transaction, so ingestion is never blocked behind one long delete. Freed
+    pages are then returned to the file system with incremental vacuuming.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.policies = app.config['RETENTION_POLICIES']
+        self.batch_size = app.config['RETENTION_BATCH_SIZE']
+
+    def enforce(self, now=None):
+        now = time.time() if now is None else now
+        with self.app.app_context():
+            deleted = 0
+            for device_id, device_type in db.session.query(Device.id, Device.type).all():
+                policy = self.policies.get(device_type, self.policies['default'])
+                for key in rollups.get_keys(device_id):
+                    deleted += self.expire(device_id, key, policy, now)
+
+            self.app.logger.info("Retention deleted %s expired row(s)" % deleted)
+            if deleted:
+                self.vacuum()
+
+    def expire(self, device_id, key, policy, now):
+        deleted = 0
+        if policy.get('raw') is not None:
+            params = {'device_id': device_id, 'key': key, 'before': now - policy['raw'] * rollups.DAY}
+            deleted += self._delete_in_batches(_DELETE_DATA_POINTS, params)
+
+        for name, resolution in RESOLUTIONS.items():
+            if policy.get(name) is not None:
+                params = {'device_id': device_id, 'key': key, 'resolution': resolution, 'before': now - policy[name] * rollups.DAY}
+                deleted += self._delete_in_batches(_DELETE_ROLLUPS, params)
+
+        return deleted
+
+    def _delete_in_batches(self, statement, params):
+        deleted = 0
+        while True:
+            count = db.session.execute(statement, dict(params, limit=self.batch_size)).rowcount
+            db.session.commit()
+            deleted += count
+            if count < self.batch_size:
+                return deleted
+
+    def vacuum(self):
+        # Release the free pages a few at a time, so the write lock is only held briefly
+        if db.session.execute(text("PRAGMA auto_vacuum")).scalar() != INCREMENTAL_VACUUM:
+            return
+
+        free_pages = db.session.execute(text("PRAGMA freelist_count")).scalar()
+        while free_pages:
+            # executescript steps the pragma to completion, a plain execute frees a single page
+            db.session.connection().connection.executescript("PRAGMA incremental_vacuum(%d)" % self.batch_size)
+            db.session.commit()
+            remaining = db.session.execute(text("PRAGMA freelist_count")).scalar()
+            if remaining >= free_pages:
+                break
+            free_pages = remaining
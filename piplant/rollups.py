@@ -0,0 +1,181 @@
+"""Incrementally maintained minute, hour and day aggregates of data points.
+
+Every data point is folded into one bucket per resolution as it is ingested,
+so reading long ranges never has to scan the raw data_point table. Buckets
+are aligned to the epoch, which means daily buckets follow UTC days.
+"""
+from itertools import groupby
+from operator import itemgetter
+from typing import List, Optional
+
+from sqlalchemy import func, text
+
+from .models import db, DataPoint, Rollup
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+# How often the client reports readings, used to estimate how many raw points a range holds
+RAW_INTERVAL = 10
+
+_UPSERT = text(
+    "INSERT INTO rollup (device_id, key, resolution, bucket, count, min, max, sum, last, last_timestamp)"
+    " VALUES (:device_id, :key, :resolution, :bucket, :count, :min, :max, :sum, :last, :last_timestamp)"
+    " ON CONFLICT (device_id, key, resolution, bucket) DO UPDATE SET"
+    " count = count + excluded.count,"
+    " min = min(min, excluded.min),"
+    " max = max(max, excluded.max),"
+    " sum = sum + excluded.sum,"
+    " last = CASE WHEN excluded.last_timestamp >= last_timestamp THEN excluded.last ELSE last END,"
+    " last_timestamp = max(last_timestamp, excluded.last_timestamp)"
+)
+
+
+def bucket_start(timestamp: float, resolution: int) -> int:
+    return int(timestamp // resolution) * resolution
+
+
+def add(data_points: List[dict]) -> None:
+    """Fold new data points into the rollups.
+
+    Each item is a dict with ``device_id``, ``key``, numeric ``value`` and epoch
+    ``timestamp``. Points are combined per bucket in memory first, so a batch
+    costs one upsert per touched bucket. The caller owns the transaction.
+    """
+    buckets = {}
+    for data_point in data_points:
+        value = data_point['value']
+        timestamp = data_point['timestamp']
+        for resolution in RESOLUTIONS:
+            index = (data_point['device_id'], data_point['key'], resolution, bucket_start(timestamp, resolution))
+            bucket = buckets.get(index)
+            if bucket is None:
+                buckets[index] = {'count': 1, 'min': value, 'max': value, 'sum': value, 'last': value, 'last_timestamp': timestamp}
+                continue
+            bucket['count'] += 1
+            bucket['min'] = min(bucket['min'], value)
+            bucket['max'] = max(bucket['max'], value)
+            bucket['sum'] += value
+            if timestamp >= bucket['last_timestamp']:
+                bucket['last'] = value
+                bucket['last_timestamp'] = timestamp
+
+    params = []
+    for (device_id, key, resolution, start), bucket in buckets.items():
+        bucket.update({'device_id': device_id, 'key': key, 'resolution': resolution, 'bucket': start})
+        params.append(bucket)
+    if params:
+        db.session.execute(_UPSERT, params)
+
+
+def get_keys(device_id: int) -> List[str]:
+    """Return the keys a device has reported, read from the daily rollups."""
+    query = db.session.query(Rollup.key).filter(Rollup.device_id == device_id, Rollup.resolution == DAY).distinct()
+    return [key for key, in query]
+
+
+def get_extent(device_id: int, key: str) -> tuple:
+    """Return the (first, last) timestamps of a key, or (None, None) without data.
+
+    The first timestamp is rounded down to the finest rollup still holding data.
+    """
+    for resolution in RESOLUTIONS:
+        first, last = db.session.query(func.min(Rollup.bucket), func.max(Rollup.last_timestamp)).filter(
+            Rollup.device_id == device_id, Rollup.key == key, Rollup.resolution == resolution).one()
+        if first is not None:
+            return first, last
+    return None, None
+
+
+def choose_resolution(start: float, end: float, max_points: int) -> Optional[int]:
+    """Pick the rollup resolution to chart [start, end) with at most about ``max_points`` points.
+
+    Returns None when the raw data points are sparse enough to be read directly.
+    """
+    span = max(end - start, 0)
+    if span <= max_points * RAW_INTERVAL:
+        return None
+    for resolution in RESOLUTIONS:
+        if span / resolution <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def get_series(device_id: int, keys: List[str], start: float, end: float, resolution: Optional[int]) -> dict:
+    """Return ``{key: [(timestamp, value), ...]}`` for [start, end) with one query for all keys.
+
+    With a resolution, each pair is a bucket start and the bucket mean.
+    Without one, the raw data points are returned.
+    """
+    if resolution is None:
+        query = db.session.query(DataPoint.key, DataPoint.timestamp, DataPoint.value).filter(
+            DataPoint.device_id == device_id, DataPoint.key.in_(keys),
+            DataPoint.timestamp >= start, DataPoint.timestamp < end).order_by(DataPoint.key, DataPoint.timestamp)
+    else:
+        query = db.session.query(Rollup.key, Rollup.bucket, Rollup.sum / Rollup.count).filter(
+            Rollup.device_id == device_id, Rollup.key.in_(keys), Rollup.resolution == resolution,
+            Rollup.bucket >= bucket_start(start, resolution), Rollup.bucket < end).order_by(Rollup.key, Rollup.bucket)
+
+    series = dict((key, []) for key in keys)
+    for key, rows in groupby(query, key=itemgetter(0)):
+        series[key] = [(timestamp, value) for _, timestamp, value in rows]
+    return series
+
+
+def _plan(start: float, end: float, resolutions: tuple) -> List[tuple]:
+    # Cover [start, end) with the coarsest whole buckets that fit, falling back
+    # to finer resolutions at the edges and to raw data points at the very ends.
+    if start >= end:
+        return []
+    if not resolutions:
+        return [(None, start, end)]
+
+    resolution = resolutions[-1]
+    low = -(-start // resolution) * resolution
+    high = end // resolution * resolution
+    if low >= high:
+        return _plan(start, end, resolutions[:-1])
+    return _plan(start, low, resolutions[:-1]) + [(resolution, low, high)] + _plan(high, end, resolutions[:-1])
+
+
+def summarize(device_id: int, key: str, start: float = None, end: float = None) -> dict:
+    """Return count, min, max, mean and last of a key over [start, end).
+
+    The range is answered from the coarsest rollups that fit inside it, so only
+    its ragged edges touch finer rollups or raw data points.
+    """
+    if start is None or end is None:
+        first, last = get_extent(device_id, key)
+        start = first if start is None else start
+        end = last + 1 if end is None and last is not None else end
+    summary = {'count': 0, 'min': None, 'max': None, 'mean': None, 'last': None, 'last_timestamp': None}
+    if start is None or end is None:
+        return summary
+
+    total = 0.0
+    for resolution, low, high in _plan(start, end, RESOLUTIONS):
+        if resolution is None:
+            filters = (DataPoint.device_id == device_id, DataPoint.key == key, DataPoint.timestamp >= low, DataPoint.timestamp < high)
+            count, minimum, maximum, subtotal = db.session.query(
+                func.count(DataPoint.id), func.min(DataPoint.value), func.max(DataPoint.value), func.sum(DataPoint.value)).filter(*filters).one()
+            latest = db.session.query(DataPoint.value, DataPoint.timestamp).filter(*filters).order_by(DataPoint.timestamp.desc()).first()
+        else:
+            filters = (Rollup.device_id == device_id, Rollup.key == key, Rollup.resolution == resolution, Rollup.bucket >= low, Rollup.bucket < high)
+            count, minimum, maximum, subtotal = db.session.query(
+                func.sum(Rollup.count), func.min(Rollup.min), func.max(Rollup.max), func.sum(Rollup.sum)).filter(*filters).one()
+            latest = db.session.query(Rollup.last, Rollup.last_timestamp).filter(*filters).order_by(Rollup.bucket.desc()).first()
+
+        if not count:
+            continue
+        summary['count'] += count
+        summary['min'] = minimum if summary['min'] is None else min(summary['min'], minimum)
+        summary['max'] = maximum if summary['max'] is None else max(summary['max'], maximum)
+        total += subtotal
+        if latest is not None and (summary['last_timestamp'] is None or latest[1] >= summary['last_timestamp']):
+            summary['last'], summary['last_timestamp'] = latest
+
+    if summary['count']:
+        summary['mean'] = total / summary['count']
+    return summary
@@ -1,8 +1,12 @@
+import csv
 import datetime
+import io
+import json
 import logging
 from urllib.parse import urlparse
 
-from flask import Blueprint, request, make_response, jsonify, Response, current_app
+import numpy as np
+from flask import Blueprint, request, make_response, jsonify, Response, current_app, stream_with_context
 from flask_login import current_user, login_required
 from werkzeug.security import check_password_hash
 
@@ -11,11 +15,29 @@ from piplant.models import db, User, Device, TPLinkSmartPlug, Schedule, DataPoin
 from piplant.models import User
 import piplant.lib as lib
 import piplant.messages as messages
+import piplant.rollups as rollups
+import piplant.downsample as downsample
 
 
 __version__ = '1'
 api = Blueprint('api', __name__)
 
+CHART_MAX_POINTS = 1000
+CHART_MAX_POINTS_LIMIT = 10000
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def parse_timestamp(value):
+    """Parse a query string timestamp given either as epoch seconds or as ISO 8601."""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return DataPoint.to_epoch(value)
+
 
 @api.errorhandler(400)
 def bad_request(message, errors=None):
@@ -193,6 +215,57 @@ def get_device(device_id):
         return bad_request('Could not get device with id %s' % device_id)
 
 
+@api.route('/devices/<int:device_id>/export', methods=['GET'])
+@login_required
+def export_device(device_id):
+    device = lib.get_device(device_id)
+    if device is None or device.user_id != current_user.id:
+        return forbidden()
+
+    # The format comes from the query string, falling back to the Accept header
+    export_format = request.args.get('format')
+    if export_format is None:
+        mimetype = request.accept_mimetypes.best_match(list(EXPORT_MIMETYPES.values()), EXPORT_MIMETYPES['ndjson'])
+        export_format = 'csv' if mimetype == EXPORT_MIMETYPES['csv'] else 'ndjson'
+    if export_format not in EXPORT_MIMETYPES:
+        return bad_request(messages.INVALID_EXPORT_FORMAT)
+
+    try:
+        start = parse_timestamp(request.args.get('from'))
+        end = parse_timestamp(request.args.get('to'))
+    except ValueError as err:
+        return bad_request(messages.INVALID_TIMESTAMP, err)
+
+    rows = lib.iter_data_points(device_id, request.args.getlist('key'), start, end, batch_size=EXPORT_BATCH_SIZE)
+
+    def generate_ndjson():
+        lines = []
+        for data_point_id, key, value, timestamp in rows:
+            lines.append(json.dumps({'id': data_point_id, 'device_id': device_id, 'key': key, 'value': value, 'timestamp': DataPoint.to_isoformat(timestamp)}))
+            if len(lines) == EXPORT_BATCH_SIZE:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['id', 'device_id', 'key', 'value', 'timestamp'])
+        for count, (data_point_id, key, value, timestamp) in enumerate(rows, 1):
+            writer.writerow([data_point_id, device_id, key, value, DataPoint.to_isoformat(timestamp)])
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    generate = generate_csv if export_format == 'csv' else generate_ndjson
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_MIMETYPES[export_format])
+    response.headers['Content-Disposition'] = 'attachment; filename=device-%s.%s' % (device_id, export_format)
+    return response
+
+
 @api.route('/devices', methods=['GET'])
 def get_all_devices():
     try:
@@ -322,24 +395,40 @@ def get_charts(device_id):
     if device is None or device.user_id != current_user.id:
         return forbidden()
 
-    # Get the unique keys for the device
-    distinct_keys = []
-    for value in db.session.query(DataPoint.key).filter(DataPoint.device_id == device_id).distinct():
-        distinct_keys.append(value)
+    try:
+        start = parse_timestamp(request.args.get('from'))
+        end = parse_timestamp(request.args.get('to'))
+    except ValueError as err:
+        return bad_request(messages.INVALID_TIMESTAMP, err)
+
+    max_points = request.args.get('max_points', CHART_MAX_POINTS, type=int)
+    if not 3 <= max_points <= CHART_MAX_POINTS_LIMIT:
+        return bad_request(messages.INVALID_MAX_POINTS)
+
+    # Default to the whole history of the device
+    keys = rollups.get_keys(device_id)
+    if start is None or end is None:
+        extents = [rollups.get_extent(device_id, key) for key in keys]
+        if start is None:
+            start = min([first for first, _ in extents], default=0)
+        if end is None:
+            end = max([last for _, last in extents], default=0) + 1
+
+    # Read every key at the resolution that fits the range, then downsample
+    resolution = rollups.choose_resolution(start, end, max_points)
+    series = rollups.get_series(device_id, keys, start, end, resolution)
 
-    # Create a Chart.js chart for each key type
     charts = []
-    for key in distinct_keys:
+    for key in keys:
         chart = {'type': 'line'}
         chart.update({'options': {}})
-        chart.update({'title': key[0]})
-        dataset_label = key[0]
+        chart.update({'title': key})
+        dataset_label = key
 
-        labels = []
-        data = []
-        for record in db.session.query(DataPoint).filter(DataPoint.device_id == device_id).filter(DataPoint.key == key[0]):
-            labels.append(record.timestamp)
-            data.append(record.value)
+        points = np.array(series[key], dtype=float).reshape(-1, 2)
+        timestamps, values = downsample.lttb(points[:, 0], points[:, 1], max_points)
+        labels = [DataPoint.to_isoformat(timestamp) for timestamp in timestamps.tolist()]
+        data = values.tolist()
 
         chart.update({'data': {
             'labels': labels,
@@ -356,10 +445,76 @@ def get_charts(device_id):
     return make_response(jsonify(charts), 200)
 
 
+@api.route('/stats/<int:device_id>', methods=['GET'])
+@login_required
+def get_stats(device_id):
+    device = lib.get_device(device_id)
+    if device is None or device.user_id != current_user.id:
+        return forbidden()
+
+    try:
+        start = parse_timestamp(request.args.get('from'))
+        end = parse_timestamp(request.args.get('to'))
+    except ValueError as err:
+        return bad_request(messages.INVALID_TIMESTAMP, err)
+
+    keys = request.args.getlist('key') or rollups.get_keys(device_id)
+    stats = dict((key, rollups.summarize(device_id, key, start, end)) for key in keys)
+    return make_response(jsonify(stats), 200)
+
+
 @api.route('/requests', methods=['POST'])
 def process_request():
-    device_id = request.get_json()['device_id']
-    for key, value in request.get_json()['payload'].items():
-        lib.create_data_point(device_id, key, value, datetime.datetime.now().isoformat())
+    # A request is either a single reading or a list of readings, where each
+    # reading is {"device_id": ..., "payload": {key: value, ...}, "timestamp": ...}
+    body = request.get_json(silent=True)
+    if body is None:
+        return bad_request(messages.SCHEMA_VALIDATION_FAILED)
+    items = body if isinstance(body, list) else [body]
+
+    readings = []
+    for item in items:
+        errors = schemas.Reading().validate(item) if isinstance(item, dict) else {'_schema': ['Invalid input type.']}
+        readings.append((item, errors))
+
+    # Look up every referenced device in one query
+    device_ids = set(int(item['device_id']) for item, errors in readings if not errors)
+    known_devices = set(device_id for device_id, in db.session.query(Device.id).filter(Device.id.in_(device_ids)))
+
+    now = datetime.datetime.now().isoformat()
+    results = []
+    data_points = []
+    for item, errors in readings:
+        if errors:
+            results.append({'status': 'fail', 'message': messages.SCHEMA_VALIDATION_FAILED, 'errors': errors})
+            continue
+
+        device_id = int(item['device_id'])
+        if device_id not in known_devices:
+            results.append({'device_id': device_id, 'status': 'fail', 'message': messages.DEVICE_NOT_FOUND})
+            continue
+
+        try:
+            values = dict((key, float(value)) for key, value in item['payload'].items())
+        except (TypeError, ValueError) as err:
+            results.append({'device_id': device_id, 'status': 'fail', 'message': messages.VALUE_NOT_NUMERIC, 'errors': str(err)})
+            continue
+
+        try:
+            timestamp = DataPoint.to_epoch(item.get('timestamp') or now)
+        except (TypeError, ValueError, AttributeError) as err:
+            results.append({'device_id': device_id, 'status': 'fail', 'message': messages.INVALID_TIMESTAMP, 'errors': str(err)})
+            continue
+
+        for key, value in values.items():
+            data_points.append({'device_id': device_id, 'key': key, 'value': value, 'timestamp': timestamp})
+        results.append({'device_id': device_id, 'status': messages.SUCCESS, 'stored': list(item['payload'].keys())})
+
+    try:
+        lib.create_data_points(data_points)
+    except Exception as err:
+        logging.error(str(err))
+        db.session.rollback()
+        return bad_request('Could not store data points.', err)
 
-    return Response(status=200)
+    return make_response(jsonify(results), 200)
@@ -64,5 +64,11 @@ class DataPoint(Schema):
     id = fields.Integer()
     device_id = fields.Integer()
     key = fields.Str()
-    value = fields.Str()
+    value = fields.Float()
     timestamp = fields.DateTime()
+
+
+class Reading(Schema):
+    device_id = fields.Integer(required=True)
+    payload = fields.Dict(keys=fields.Str(), values=fields.Raw(), required=True)
+    timestamp = fields.Raw(required=False)  # ISO 8601 or seconds since the epoch
@@ -17,6 +17,7 @@ setup(
         'marshmallow',
         'werkzeug',
         'requests',
-        'pyjwt'
+        'pyjwt',
+        'numpy'
     ]
 )
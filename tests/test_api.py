@@ -1,3 +1,7 @@
+import csv
+import io
+import json
+
 import pytest
 
 from piplant.db import get_db
@@ -104,3 +108,116 @@ class TestDeviceAPI:
 # TODO: PUT /devices/<device_id>
 
 # TODO: DELETE /devices/<device_id>
+
+
+class TestRequestAPI:
+    def test_single_reading(self, client, app, auth, api_url, devices):
+        device_id = devices[0]["id"]
+        response = client.post("%s/requests" % api_url, json={"device_id": device_id, "payload": {"relay_state": 1, "power": 2.5}})
+        assert response.status_code == 200, response.get_json()
+        assert len(response.get_json()) == 1
+        assert response.get_json()[0]["status"] == "success"
+        assert sorted(response.get_json()[0]["stored"]) == ["power", "relay_state"]
+
+        with app.app_context():
+            assert get_db().execute("select count(*) from data_point where device_id = ?", (device_id,)).fetchone()[0] == 2
+
+    def test_batch_readings(self, client, app, auth, api_url, devices):
+        device_id = devices[0]["id"]
+        body = [
+            {"device_id": device_id, "payload": {"temperature": 70.1}, "timestamp": "2020-11-20T10:00:00"},
+            {"device_id": device_id, "payload": {"temperature": 70.2}, "timestamp": "2020-11-20T10:00:10"},
+            {"device_id": 9999, "payload": {"temperature": 70.3}},
+            {"payload": {"temperature": 70.4}},
+        ]
+        response = client.post("%s/requests" % api_url, json=body)
+        assert response.status_code == 200, response.get_json()
+
+        results = response.get_json()
+        assert [result["status"] for result in results] == ["success", "success", "fail", "fail"]
+        assert results[2]["device_id"] == 9999
+
+        with app.app_context():
+            assert get_db().execute("select count(*) from data_point where device_id = ?", (device_id,)).fetchone()[0] == 2
+
+    def test_invalid_body(self, client, api_url):
+        response = client.post("%s/requests" % api_url, data="not json", content_type="application/json")
+        assert response.status_code == 400
+
+
+class TestStatsAPI:
+    def test_get_stats(self, client, auth, api_url, devices):
+        device_id = devices[0]["id"]
+        body = [{"device_id": device_id, "payload": {"temperature": value}, "timestamp": "2020-11-20T10:00:%02d" % value} for value in range(10)]
+        response = client.post("%s/requests" % api_url, json=body)
+        assert response.status_code == 200, response.get_json()
+
+        response = client.get("%s/stats/%s" % (api_url, device_id))
+        assert response.status_code == 200, response.get_json()
+        stats = response.get_json()["temperature"]
+        assert stats["count"] == 10
+        assert stats["min"] == 0
+        assert stats["max"] == 9
+        assert stats["last"] == 9
+
+        response = client.get("%s/charts/%s" % (api_url, device_id))
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()[0]["data"]["datasets"][0]["data"] == list(range(10))
+
+
+class TestChartAPI:
+    def test_get_charts_range_and_max_points(self, client, auth, api_url, devices):
+        device_id = devices[0]["id"]
+        body = [{"device_id": device_id, "payload": {"temperature": value, "humidity": 2 * value}, "timestamp": 1605866400 + value} for value in range(100)]
+        response = client.post("%s/requests" % api_url, json=body)
+        assert response.status_code == 200, response.get_json()
+        assert all(result["status"] == "success" for result in response.get_json())
+
+        response = client.get("%s/charts/%s?max_points=10" % (api_url, device_id))
+        assert response.status_code == 200, response.get_json()
+        charts = dict((chart["title"], chart) for chart in response.get_json())
+        assert sorted(charts) == ["humidity", "temperature"]
+        assert len(charts["temperature"]["data"]["datasets"][0]["data"]) == 10
+        assert charts["temperature"]["data"]["datasets"][0]["data"][0] == 0
+        assert charts["temperature"]["data"]["datasets"][0]["data"][-1] == 99
+
+        response = client.get("%s/charts/%s?from=%s&to=%s" % (api_url, device_id, 1605866410, 1605866420))
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()[0]["data"]["datasets"][0]["data"] == [2 * value for value in range(10, 20)]
+
+        response = client.get("%s/charts/%s?max_points=1" % (api_url, device_id))
+        assert response.status_code == 400
+
+
+class TestExportAPI:
+    @pytest.fixture
+    def readings(self, client, api_url, devices, monkeypatch):
+        # A small batch size still exercises the chunked streaming
+        monkeypatch.setattr("piplant.views.api.EXPORT_BATCH_SIZE", 7)
+        device_id = devices[0]["id"]
+        body = [{"device_id": device_id, "payload": {"temperature": value, "power": value + 100}, "timestamp": 1605866400 + value} for value in range(25)]
+        response = client.post("%s/requests" % api_url, json=body)
+        assert response.status_code == 200, response.get_json()
+        return device_id
+
+    def test_export_ndjson(self, client, api_url, readings):
+        response = client.get("%s/devices/%s/export?key=temperature&from=1605866405" % (api_url, readings))
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [row["value"] for row in rows] == list(range(5, 25))
+        assert all(row["key"] == "temperature" for row in rows)
+
+    def test_export_csv(self, client, api_url, readings):
+        response = client.get("%s/devices/%s/export" % (api_url, readings), headers={"Accept": "text/csv"})
+        assert response.status_code == 200
+        assert response.mimetype == "text/csv"
+
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        assert len(rows) == 50
+        assert rows[0]["key"] == "power" and float(rows[0]["value"]) == 100
+
+    def test_export_invalid_format(self, client, api_url, readings):
+        response = client.get("%s/devices/%s/export?format=xml" % (api_url, readings))
+        assert response.status_code == 400
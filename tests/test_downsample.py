@@ -0,0 +1,31 @@
+import numpy as np
+
+from piplant.downsample import lttb
+
+
+def test_lttb_keeps_short_series():
+    x, y = lttb([1, 2, 3], [4, 5, 6], 10)
+    assert x.tolist() == [1, 2, 3]
+    assert y.tolist() == [4, 5, 6]
+
+
+def test_lttb_reduces_to_threshold():
+    x = np.arange(10000)
+    y = np.sin(x / 100.0)
+    sampled_x, sampled_y = lttb(x, y, 500)
+
+    assert len(sampled_x) == len(sampled_y) == 500
+    assert sampled_x[0] == 0 and sampled_x[-1] == 9999
+    assert np.all(np.diff(sampled_x) > 0)
+
+
+def test_lttb_preserves_spikes():
+    y = np.zeros(1000)
+    y[123] = 100
+    y[789] = -100
+    sampled_x, sampled_y = lttb(np.arange(1000), y, 50)
+
+    assert 123 in sampled_x
+    assert 789 in sampled_x
+    assert sampled_y.max() == 100
+    assert sampled_y.min() == -100
@@ -0,0 +1,68 @@
+import datetime
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from piplant.app import create_app
+from piplant.migrations import MIGRATIONS
+
+
+@pytest.fixture
+def legacy_db_path():
+    # A database in the layout used before data points were typed
+    db_fd, db_path = tempfile.mkstemp()
+    connection = sqlite3.connect(db_path)
+    connection.executescript("""
+        CREATE TABLE data_point (
+            id INTEGER NOT NULL,
+            device_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            timestamp TEXT,
+            PRIMARY KEY (id)
+        );
+        INSERT INTO data_point (device_id, key, value, timestamp) VALUES
+            (1, 'temperature', '70.5', '2020-11-20T10:00:00.123456'),
+            (1, 'relay_state', '1', '2020-11-20T10:00:10'),
+            (1, 'temperature', 'garbage', '2020-11-20T10:00:20'),
+            (2, 'temperature', '71', NULL);
+    """)
+    connection.commit()
+    connection.close()
+
+    yield db_path
+
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+def test_upgrade_converts_data_points(legacy_db_path):
+    create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///" + legacy_db_path, "DATABASE": legacy_db_path})
+
+    connection = sqlite3.connect(legacy_db_path)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+
+    columns = dict((row[1], row[2]) for row in connection.execute("PRAGMA table_info(data_point)"))
+    assert columns["value"] == "FLOAT"
+    assert columns["timestamp"] == "FLOAT"
+
+    indexes = [row[1] for row in connection.execute("PRAGMA index_list(data_point)")]
+    assert "ix_data_point_device_id_key_timestamp" in indexes
+
+    rollups = connection.execute("SELECT key, count, last FROM rollup WHERE resolution = 86400 ORDER BY key").fetchall()
+    assert rollups == [("relay_state", 1, 1.0), ("temperature", 1, 70.5)]
+
+    rows = connection.execute("SELECT id, key, value, timestamp FROM data_point ORDER BY id").fetchall()
+    assert rows == [
+        (1, "temperature", 70.5, pytest.approx(datetime.datetime(2020, 11, 20, 10, 0, 0, 123456).timestamp())),
+        (2, "relay_state", 1.0, datetime.datetime(2020, 11, 20, 10, 0, 10).timestamp()),
+    ]
+    connection.close()
+
+
+def test_fresh_database_is_current(app):
+    connection = sqlite3.connect(app.config["DATABASE"])
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    connection.close()
@@ -0,0 +1,32 @@
+import piplant.lib as lib
+import piplant.rollups as rollups
+from piplant.models import db, DataPoint, Rollup
+from piplant.retention import Retention
+
+NOW = 1605830400 + 400 * rollups.DAY
+
+
+def test_enforce(app, client, auth):
+    auth.login()
+    response = client.post("/api/v1/devices", data={"name": "Probe", "type": "ds18b20", "description": ""})
+    device_id = response.get_json()["id"]
+
+    # One reading a day for the last 400 days
+    points = [{"device_id": device_id, "key": "temperature", "value": float(day), "timestamp": NOW - day * rollups.DAY} for day in range(1, 401)]
+    app.config["RETENTION_BATCH_SIZE"] = 7
+    app.config["RETENTION_POLICIES"] = {
+        "default": {"raw": None, "minute": None, "hour": None, "day": None},
+        "ds18b20": {"raw": 10, "minute": 30, "hour": 365, "day": None},
+    }
+    with app.app_context():
+        lib.create_data_points(points)
+
+    Retention(app).enforce(now=NOW)
+
+    with app.app_context():
+        assert db.session.query(DataPoint).filter(DataPoint.timestamp < NOW - 10 * rollups.DAY).count() == 0
+        assert db.session.query(DataPoint).count() == 10
+        assert Rollup.query.filter_by(resolution=rollups.MINUTE).count() == 30
+        assert Rollup.query.filter_by(resolution=rollups.HOUR).count() == 365
+        assert Rollup.query.filter_by(resolution=rollups.DAY).count() == 400
+        assert db.session.execute("PRAGMA freelist_count").scalar() == 0
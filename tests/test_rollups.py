@@ -0,0 +1,60 @@
+import pytest
+
+import piplant.lib as lib
+import piplant.rollups as rollups
+from piplant.models import Rollup
+
+# 2020-11-20 00:00:00 UTC
+BASE = 1605830400
+
+
+@pytest.fixture
+def data_points(app):
+    # One reading every 10 minutes for two days, with a handful of out of order arrivals
+    points = [{"device_id": 1, "key": "temperature", "value": float(i % 50), "timestamp": BASE + i * 600} for i in range(288)]
+    points.reverse()
+    with app.app_context():
+        lib.create_data_points(points[:100])
+        lib.create_data_points(points[100:])
+    return points
+
+
+def test_rollups_are_maintained(app, data_points):
+    with app.app_context():
+        day = Rollup.query.filter_by(device_id=1, key="temperature", resolution=rollups.DAY, bucket=BASE).one()
+        first_day = [point for point in data_points if point["timestamp"] < BASE + rollups.DAY]
+        assert day.count == len(first_day)
+        assert day.min == min(point["value"] for point in first_day)
+        assert day.max == max(point["value"] for point in first_day)
+        assert day.sum == sum(point["value"] for point in first_day)
+        assert day.last == max(first_day, key=lambda point: point["timestamp"])["value"]
+
+        assert Rollup.query.filter_by(device_id=1, resolution=rollups.HOUR).count() == 48
+        assert Rollup.query.filter_by(device_id=1, resolution=rollups.MINUTE).count() == 288
+
+
+@pytest.mark.parametrize(
+    ("start", "end"),
+    (
+        (BASE, BASE + 2 * rollups.DAY),
+        (BASE + 1234, BASE + rollups.DAY + 7 * rollups.HOUR + 321),
+        (BASE + 30, BASE + 90),
+    ),
+)
+def test_summarize_matches_raw_data(app, data_points, start, end):
+    expected = [point for point in data_points if start <= point["timestamp"] < end]
+    with app.app_context():
+        summary = rollups.summarize(1, "temperature", start, end)
+
+    assert summary["count"] == len(expected)
+    if expected:
+        assert summary["min"] == min(point["value"] for point in expected)
+        assert summary["max"] == max(point["value"] for point in expected)
+        assert summary["mean"] == pytest.approx(sum(point["value"] for point in expected) / len(expected))
+        assert summary["last"] == max(expected, key=lambda point: point["timestamp"])["value"]
+
+
+def test_choose_resolution():
+    assert rollups.choose_resolution(BASE, BASE + 3600, 1000) is None
+    assert rollups.choose_resolution(BASE, BASE + 7 * rollups.DAY, 1000) == rollups.HOUR
+    assert rollups.choose_resolution(BASE, BASE + 365 * rollups.DAY, 1000) == rollups.DAY